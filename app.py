@@ -1,6 +1,6 @@
 import os
 import logging
-from flask import Flask, request, jsonify, render_template, send_file
+from flask import Flask, request, jsonify, render_template, send_file, Response
 from flask_cors import CORS
 from qr_generator import QRCodeGenerator
 
@@ -33,7 +33,8 @@ def health_check():
         'status': 'healthy',
         'service': 'QR Code Generator API',
         'timestamp': str(datetime.now()),
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'render_coalescing': qr_gen.coalescer.stats()
     }), 200
 
 @app.route('/docs')
@@ -128,6 +129,8 @@ def generate_url_qr():
         
         return response
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Error generating URL QR code: {str(e)}")
         logging.error(traceback.format_exc())
@@ -153,6 +156,8 @@ def generate_text_qr():
         
         return response
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Error generating text QR code: {str(e)}")
         return jsonify({'error': f'Failed to generate QR code: {str(e)}'}), 500
@@ -179,6 +184,8 @@ def generate_email_qr():
         
         return response
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Error generating email QR code: {str(e)}")
         return jsonify({'error': f'Failed to generate QR code: {str(e)}'}), 500
@@ -203,6 +210,8 @@ def generate_phone_qr():
         
         return response
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Error generating phone QR code: {str(e)}")
         return jsonify({'error': f'Failed to generate QR code: {str(e)}'}), 500
@@ -228,6 +237,8 @@ def generate_sms_qr():
         
         return response
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Error generating SMS QR code: {str(e)}")
         return jsonify({'error': f'Failed to generate QR code: {str(e)}'}), 500
@@ -266,6 +277,8 @@ def generate_vcard_qr():
         
         return response
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Error generating vCard QR code: {str(e)}")
         return jsonify({'error': f'Failed to generate QR code: {str(e)}'}), 500
@@ -292,6 +305,8 @@ def generate_wifi_qr():
         
         return response
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Error generating WiFi QR code: {str(e)}")
         return jsonify({'error': f'Failed to generate QR code: {str(e)}'}), 500
@@ -317,10 +332,46 @@ def generate_location_qr():
         
         return response
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Error generating location QR code: {str(e)}")
         return jsonify({'error': f'Failed to generate QR code: {str(e)}'}), 500
 
+@app.route('/api/v1/qr/print', methods=['POST'])
+def generate_print_qr():
+    """Stream a print-resolution PNG sized in millimetres at a given DPI"""
+    try:
+        data = request.get_json()
+        
+        if not data or 'text' not in data:
+            return jsonify({'error': 'Text is required'}), 400
+        
+        text = data['text']
+        options = data.get('options', {})
+        
+        if not options.get('dpi') or not options.get('physical_size_mm'):
+            return jsonify({'error': 'dpi and physical_size_mm options are required'}), 400
+        
+        try:
+            chunks, print_info = qr_gen.stream_print_png(text, options)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        response = Response(chunks, mimetype='image/png')
+        response.headers['X-QR-DPI'] = str(print_info['dpi'])
+        response.headers['X-QR-Module-Pixels'] = str(print_info['module_pixels'])
+        response.headers['X-QR-Pixel-Size'] = str(print_info['pixel_size'])
+        response.headers['X-QR-Physical-Size-MM'] = str(print_info['physical_size_mm'])
+        response.headers['X-RateLimit-Limit'] = '1000'
+        response.headers['X-RateLimit-Remaining'] = '999'
+        
+        return response
+        
+    except Exception as e:
+        logging.error(f"Error generating print QR code: {str(e)}")
+        return jsonify({'error': f'Failed to generate QR code: {str(e)}'}), 500
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint not found'}), 404
@@ -0,0 +1,499 @@
+"""Load-test and soak harness for the QR Code Generator API
+
+Starts the service locally (gunicorn, as in the Procfile), replays a weighted
+traffic mix from a JSONL file with a fleet of client threads, and reports
+throughput, latency percentiles, error rate and server RSS over time.
+Exits non-zero when any configured threshold is breached.
+
+Each line of the traffic file is a JSON object:
+
+    {"path": "/api/v1/qr/url", "body": {"url": "example.com"}, "weight": 5}
+
+"method" defaults to POST (GET when there is no body) and "weight" to 1.
+Latency is also reported per "name", which defaults to the path plus any
+non-PNG output format (e.g. "/api/v1/qr/url PDF").
+Every request body is made unique by default so the server's render
+coalescing does not inflate throughput; pass --coalesce to replay bodies
+verbatim. The /health coalescing counters are included in the report.
+
+Examples:
+
+    python loadtest.py --duration 60 --concurrency 16
+    python loadtest.py --duration 60 --coalesce   # measure coalescing under bursts
+    python loadtest.py --duration 14400 --rss-settle 300 --max-rss-growth-mb 50   # soak
+    python loadtest.py --url http://127.0.0.1:5000 --server-pid 1234
+"""
+import argparse
+import json
+import math
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_TRAFFIC_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'loadtest_traffic.jsonl')
+DEFAULT_SERVER_CMD = 'gunicorn --bind 127.0.0.1:{port} --workers 1 --threads 4 --timeout 0 main:app'
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def load_traffic(path):
+    """Load the weighted traffic mix from a JSONL file"""
+    entries = []
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            entry = json.loads(line)
+            if 'path' not in entry:
+                raise ValueError(f"{path}:{line_number}: 'path' is required")
+            entry.setdefault('body', None)
+            entry.setdefault('method', 'POST' if entry['body'] is not None else 'GET')
+            entry.setdefault('weight', 1)
+            entry.setdefault('name', default_entry_name(entry))
+            entries.append(entry)
+    if not entries:
+        raise ValueError(f"{path}: no traffic entries")
+    return entries
+
+
+def default_entry_name(entry):
+    """Label an entry by path and output format, so PDF/SVG traffic is reported apart"""
+    options = (entry['body'] or {}).get('options') or {}
+    output_format = str(options.get('format', 'PNG')).upper()
+    return entry['path'] if output_format == 'PNG' else f"{entry['path']} {output_format}"
+
+
+def make_unique(body, counter):
+    """Vary the payload with a counter so identical requests are not coalesced"""
+    body = dict(body)
+    for field in ('text', 'url', 'email', 'ssid', 'phone'):
+        if isinstance(body.get(field), str):
+            body[field] = f"{body[field]}#{counter}"
+            return body
+    # No string field to vary (e.g. location): an extra option changes the
+    # coalescing key without changing what is encoded
+    body['options'] = {**body.get('options', {}), 'loadtest_nonce': counter}
+    return body
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _child_pids():
+    """Map each pid to its direct children using /proc"""
+    children = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'r') as f:
+                # The command name may contain spaces, so split after its closing paren
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        children.setdefault(int(fields[1]), []).append(int(name))
+    return children
+
+
+def process_tree_usage(pid):
+    """Return (rss_bytes, cpu_seconds) summed over pid and its descendants"""
+    children = _child_pids()
+    pending = [pid]
+    rss = 0
+    cpu_ticks = 0
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/stat', 'r') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        # fields[0] is proc(5) field 3 (state): utime, stime and rss follow at 14, 15 and 24
+        cpu_ticks += int(fields[11]) + int(fields[12])
+        rss += int(fields[21]) * PAGE_SIZE
+        pending.extend(children.get(current, []))
+    return rss, cpu_ticks / CLOCK_TICKS
+
+
+def fetch_coalescing(base_url):
+    """Read the render coalescing counters from /health, or None if unavailable"""
+    try:
+        with urllib.request.urlopen(f'{base_url}/health', timeout=5) as response:
+            return json.loads(response.read()).get('render_coalescing')
+    except (urllib.error.URLError, ConnectionError, socket.timeout, ValueError):
+        return None
+
+
+def free_port():
+    """Pick an unused local TCP port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_health(base_url, timeout):
+    """Poll /health until the server answers or the timeout expires"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'{base_url}/health', timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            pass
+        time.sleep(0.2)
+    return False
+
+
+class LoadRun:
+    """Closed-loop client fleet replaying a traffic mix against one server"""
+
+    def __init__(self, base_url, traffic, concurrency, duration, warmup, unique, request_timeout, seed=None):
+        self.base_url = base_url.rstrip('/')
+        self.traffic = traffic
+        self.weights = [entry['weight'] for entry in traffic]
+        self.concurrency = concurrency
+        self.duration = duration
+        self.warmup = warmup
+        self.unique = unique
+        self.request_timeout = request_timeout
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._counter = 0
+        self.latencies = []
+        self.errors = 0
+        self.error_samples = []
+        self.per_entry = {}
+        self.measure_start = None
+        self.measure_end = None
+
+    def _next_request(self, rng):
+        entry = rng.choices(self.traffic, weights=self.weights)[0]
+        body = entry['body']
+        if body is not None and self.unique:
+            with self._lock:
+                self._counter += 1
+                counter = self._counter
+            body = make_unique(body, counter)
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(f"{self.base_url}{entry['path']}", data=data, method=entry['method'])
+        if data is not None:
+            request.add_header('Content-Type', 'application/json')
+        return entry['name'], request
+
+    def _send(self, request):
+        """Send one request and drain the body; return an error string or None"""
+        try:
+            with urllib.request.urlopen(request, timeout=self.request_timeout) as response:
+                while response.read(64 * 1024):
+                    pass
+                return None
+        except urllib.error.HTTPError as e:
+            return f'HTTP {e.code}'
+        except Exception as e:
+            return type(e).__name__
+
+    def _client(self, seed, stop_at):
+        rng = random.Random(seed)
+        while time.time() < stop_at:
+            name, request = self._next_request(rng)
+            started = time.perf_counter()
+            error = self._send(request)
+            latency = time.perf_counter() - started
+            finished = time.time()
+
+            if finished < self.measure_start or finished > self.measure_end:
+                continue
+            with self._lock:
+                self.latencies.append(latency)
+                stats = self.per_entry.setdefault(name, {'requests': 0, 'errors': 0, 'latencies': []})
+                stats['requests'] += 1
+                stats['latencies'].append(latency)
+                if error is not None:
+                    self.errors += 1
+                    stats['errors'] += 1
+                    if len(self.error_samples) < 20:
+                        self.error_samples.append(f'{name}: {error}')
+
+    def _client_seed(self, index):
+        return None if self.seed is None else self.seed * 1000003 + index
+
+    def run(self, sampler=None):
+        """Run the fleet; sampler is called periodically until the run ends"""
+        now = time.time()
+        self.measure_start = now + self.warmup
+        self.measure_end = self.measure_start + self.duration
+        clients = [
+            threading.Thread(target=self._client, args=(self._client_seed(index), self.measure_end), daemon=True)
+            for index in range(self.concurrency)
+        ]
+        for client in clients:
+            client.start()
+        if sampler is not None:
+            sampler(self.measure_start, self.measure_end)
+        for client in clients:
+            client.join()
+
+
+class ResourceSampler:
+    """Samples server RSS and CPU time at a fixed interval"""
+
+    def __init__(self, pid, interval):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.cpu_start = None
+        self.cpu_end = None
+
+    def __call__(self, measure_start, measure_end):
+        while time.time() < measure_start:
+            time.sleep(min(self.interval, max(0.0, measure_start - time.time())))
+        _, self.cpu_start = process_tree_usage(self.pid)
+        while True:
+            now = time.time()
+            rss, cpu = process_tree_usage(self.pid)
+            self.samples.append({'t': round(now - measure_start, 2), 'rss_mb': round(rss / 2 ** 20, 2)})
+            self.cpu_end = cpu
+            if now >= measure_end:
+                break
+            time.sleep(min(self.interval, max(0.0, measure_end - now)))
+
+
+def rss_slope_mb_per_hour(samples):
+    """Least-squares RSS growth rate over the run"""
+    if len(samples) < 2:
+        return 0.0
+    times = [sample['t'] for sample in samples]
+    values = [sample['rss_mb'] for sample in samples]
+    mean_t = sum(times) / len(times)
+    mean_v = sum(values) / len(values)
+    variance = sum((t - mean_t) ** 2 for t in times)
+    if variance == 0:
+        return 0.0
+    covariance = sum((t - mean_t) * (v - mean_v) for t, v in zip(times, values))
+    return covariance / variance * 3600
+
+
+def latency_summary(latencies):
+    """p50/p99/p999/max in milliseconds for a list of latencies in seconds"""
+    latencies = sorted(latencies)
+    to_ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        'p50': to_ms(percentile(latencies, 0.50)),
+        'p99': to_ms(percentile(latencies, 0.99)),
+        'p999': to_ms(percentile(latencies, 0.999)),
+        'max': to_ms(latencies[-1] if latencies else None)
+    }
+
+
+def build_report(run, sampler, coalescing_before=None, coalescing_after=None, rss_settle=0.0):
+    """Summarize a finished run"""
+    total = len(run.latencies)
+    # Slow paths (PDF, print) would hide behind fast ones in the aggregate alone
+    per_entry = {
+        name: {
+            'requests': stats['requests'],
+            'errors': stats['errors'],
+            'latency_ms': latency_summary(stats['latencies'])
+        }
+        for name, stats in sorted(run.per_entry.items())
+    }
+
+    report = {
+        'duration_s': run.duration,
+        'concurrency': run.concurrency,
+        'requests': total,
+        'errors': run.errors,
+        'error_rate': round(run.errors / total, 5) if total else None,
+        'throughput_rps': round(total / run.duration, 2) if run.duration else None,
+        'latency_ms': latency_summary(run.latencies),
+        'per_entry': per_entry,
+        'error_samples': run.error_samples
+    }
+
+    if coalescing_before is not None and coalescing_after is not None:
+        # Counters cover warmup too; with several workers /health reports only one of them
+        report['render_coalescing'] = {
+            'unique_payloads': run.unique,
+            'before': coalescing_before,
+            'after': coalescing_after,
+            'renders': coalescing_after['renders'] - coalescing_before['renders'],
+            'coalesced': coalescing_after['coalesced'] - coalescing_before['coalesced']
+        }
+
+    if sampler is not None and sampler.samples:
+        cpu_seconds = (sampler.cpu_end or 0) - (sampler.cpu_start or 0)
+        rss_values = [sample['rss_mb'] for sample in sampler.samples]
+        # Allocator and import growth early in the run is not a leak, so growth
+        # and slope are measured from the first sample after the settle period
+        settled = [sample for sample in sampler.samples if sample['t'] >= rss_settle]
+        report['server'] = {
+            'cpu_seconds': round(cpu_seconds, 2),
+            # Requests served per second of server CPU, i.e. sustainable RPS per core
+            'rps_per_core': round(total / cpu_seconds, 2) if cpu_seconds > 0 else None,
+            'rss_start_mb': rss_values[0],
+            'rss_end_mb': rss_values[-1],
+            'rss_peak_mb': max(rss_values),
+            'rss_settle_s': rss_settle,
+            'rss_baseline_mb': settled[0]['rss_mb'] if settled else None,
+            'rss_growth_mb': round(settled[-1]['rss_mb'] - settled[0]['rss_mb'], 2) if len(settled) >= 2 else None,
+            'rss_slope_mb_per_hour': round(rss_slope_mb_per_hour(settled), 2) if len(settled) >= 2 else None,
+            'rss_samples': sampler.samples
+        }
+
+    return report
+
+
+def check_thresholds(report, args):
+    """Return a list of threshold violations"""
+    failures = []
+    latency = report['latency_ms']
+    server = report.get('server', {})
+
+    if report['requests'] == 0:
+        failures.append('no requests completed')
+    checks = [
+        (args.min_rps, report['throughput_rps'], lambda limit, value: value < limit, 'throughput_rps'),
+        (args.min_rps_per_core, server.get('rps_per_core'), lambda limit, value: value < limit, 'rps_per_core'),
+        (args.max_p50_ms, latency['p50'], lambda limit, value: value > limit, 'p50 latency ms'),
+        (args.max_p99_ms, latency['p99'], lambda limit, value: value > limit, 'p99 latency ms'),
+        (args.max_p999_ms, latency['p999'], lambda limit, value: value > limit, 'p999 latency ms'),
+        (args.max_error_rate, report['error_rate'], lambda limit, value: value > limit, 'error_rate'),
+        (args.max_rss_growth_mb, server.get('rss_growth_mb'), lambda limit, value: value > limit, 'rss_growth_mb'),
+        (args.max_rss_slope_mb_per_hour, server.get('rss_slope_mb_per_hour'), lambda limit, value: value > limit,
+         'rss_slope_mb_per_hour'),
+    ]
+    for limit, value, breached, name in checks:
+        if limit is None:
+            continue
+        if value is None:
+            failures.append(f'{name} unavailable (limit {limit})')
+        elif breached(limit, value):
+            failures.append(f'{name} {value} breaches limit {limit}')
+    return failures
+
+
+def print_summary(report, failures):
+    latency = report['latency_ms']
+    print(f"requests:    {report['requests']} ({report['errors']} errors, rate {report['error_rate']})")
+    print(f"throughput:  {report['throughput_rps']} req/s")
+    print(f"latency ms:  p50 {latency['p50']}  p99 {latency['p99']}  p999 {latency['p999']}  max {latency['max']}")
+    for name, stats in report['per_entry'].items():
+        entry_latency = stats['latency_ms']
+        print(f"  {name:<28} {stats['requests']:>6} req  p50 {entry_latency['p50']}  p99 {entry_latency['p99']}  "
+              f"p999 {entry_latency['p999']}  ({stats['errors']} errors)")
+    coalescing = report.get('render_coalescing')
+    if coalescing:
+        print(f"coalescing:  {coalescing['renders']} renders, {coalescing['coalesced']} coalesced "
+              f"({'unique' if coalescing['unique_payloads'] else 'verbatim'} payloads)")
+    server = report.get('server')
+    if server:
+        print(f"server cpu:  {server['cpu_seconds']}s ({server['rps_per_core']} req/s per core)")
+        print(f"server rss:  {server['rss_start_mb']} -> {server['rss_end_mb']} MB (peak {server['rss_peak_mb']})")
+        print(f"rss growth:  {server['rss_growth_mb']} MB, {server['rss_slope_mb_per_hour']} MB/h "
+              f"after {server['rss_settle_s']}s settle (baseline {server['rss_baseline_mb']} MB)")
+    for sample in report['error_samples'][:5]:
+        print(f"error:       {sample}")
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    else:
+        print("PASS")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--traffic', default=DEFAULT_TRAFFIC_FILE, help='JSONL traffic mix to replay')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds (use hours for soak runs)')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds of unmeasured traffic before measuring')
+    parser.add_argument('--concurrency', type=int, default=8, help='number of client threads')
+    parser.add_argument('--coalesce', action='store_true',
+                        help='replay bodies verbatim so identical renders can be coalesced (default: unique bodies)')
+    parser.add_argument('--request-timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=None, help='seed the client fleet for reproducible mixes')
+    parser.add_argument('--rss-interval', type=float, default=1.0, help='seconds between RSS samples')
+    parser.add_argument('--rss-settle', type=float, default=None,
+                        help='measured seconds before the RSS growth baseline is taken '
+                             '(default: a quarter of --duration, at most 300)')
+    parser.add_argument('--server-cmd', default=DEFAULT_SERVER_CMD,
+                        help='command used to start the server; {port} is substituted')
+    parser.add_argument('--startup-timeout', type=float, default=30)
+    parser.add_argument('--url', help='target an already running server instead of starting one')
+    parser.add_argument('--server-pid', type=int, help='pid to sample RSS from when using --url')
+    parser.add_argument('--report', help='write the full JSON report to this path')
+    parser.add_argument('--min-rps', type=float)
+    parser.add_argument('--min-rps-per-core', type=float)
+    parser.add_argument('--max-p50-ms', type=float)
+    parser.add_argument('--max-p99-ms', type=float)
+    parser.add_argument('--max-p999-ms', type=float)
+    parser.add_argument('--max-error-rate', type=float)
+    parser.add_argument('--max-rss-growth-mb', type=float, help='limit on RSS growth after the settle period')
+    parser.add_argument('--max-rss-slope-mb-per-hour', type=float,
+                        help='limit on the least-squares RSS trend after the settle period')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    traffic = load_traffic(args.traffic)
+
+    server = None
+    server_pid = args.server_pid
+    base_url = args.url
+    if base_url is None:
+        port = free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        command = shlex.split(args.server_cmd.format(port=port))
+        server = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        server_pid = server.pid
+
+    try:
+        if not wait_for_health(base_url, args.startup_timeout):
+            print(f"Server at {base_url} did not become healthy", file=sys.stderr)
+            return 2
+
+        coalescing_before = fetch_coalescing(base_url)
+        run = LoadRun(base_url, traffic, args.concurrency, args.duration, args.warmup,
+                      not args.coalesce, args.request_timeout, args.seed)
+        sampler = None
+        if server_pid is not None and os.path.isdir(f'/proc/{server_pid}'):
+            sampler = ResourceSampler(server_pid, args.rss_interval)
+        run.run(sampler)
+        coalescing_after = fetch_coalescing(base_url)
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    rss_settle = args.rss_settle if args.rss_settle is not None else min(300.0, args.duration / 4)
+    report = build_report(run, sampler, coalescing_before, coalescing_after, rss_settle)
+    failures = check_thresholds(report, args)
+    report['failures'] = failures
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print_summary(report, failures)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
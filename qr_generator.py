@@ -1,12 +1,16 @@
 import qrcode
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, ImageColor
 import io
 import base64
 import logging
+import math
+import struct
+import zlib
+import json
+import copy
+import threading
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
-import tempfile
-import os
 
 # Try to import advanced styling features, fallback to basic if not available
 try:
@@ -16,8 +20,100 @@ try:
 except ImportError:
     ADVANCED_STYLING = False
 
+MM_PER_INCH = 25.4
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Rasters larger than this (in pixels) are encoded strip by strip instead of via PIL
+STRIP_RENDER_THRESHOLD = 2048 * 2048
+# Compressed bytes buffered before an IDAT chunk is emitted
+STRIP_CHUNK_BYTES = 64 * 1024
+# Upper bound on the edge length of any render (~1.27m at 600 DPI)
+MAX_RENDER_PIXELS = 30000
+# Highest accepted print resolution; keeps the PNG pHYs chunk well within range
+MAX_DPI = 10000
+
+class _InFlightRender:
+    """A render in progress that other identical requests can wait on"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class RenderCoalescer:
+    """Single-flight deduplication of identical concurrent renders
+    
+    The first caller for a key runs the render; callers arriving with the
+    same key while it is in progress block until it finishes and receive a
+    copy of its result (or its exception). Nothing is cached afterwards.
+    State is per process, so gunicorn needs threaded workers to benefit.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.renders = 0
+        self.coalesced = 0
+    
+    def run(self, key, render):
+        """Run render() for key, or wait for the identical render already running"""
+        with self._lock:
+            call = self._in_flight.get(key)
+            if call is None:
+                call = _InFlightRender()
+                self._in_flight[key] = call
+                self.renders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                # Not chained: the leader's traceback is still changing while it unwinds
+                raise self._waiter_error(call.error) from None
+            # Each caller gets its own copy so responses can be modified safely
+            return copy.deepcopy(call.result)
+        
+        try:
+            call.result = render()
+            return call.result
+        except BaseException as e:
+            # Recorded for SystemExit and friends too, so waiters never see a bare None
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+    
+    def _waiter_error(self, error):
+        """Build a fresh, unchained exception for a waiter so no traceback is shared
+        
+        The copy keeps the original type (so ValueError still maps to a 400);
+        exceptions that cannot be copied, and process-level ones such as
+        SystemExit or KeyboardInterrupt, are wrapped in a RuntimeError.
+        """
+        if not isinstance(error, Exception):
+            return RuntimeError(f"Coalesced render aborted: {type(error).__name__}")
+        try:
+            waiter_error = copy.copy(error)
+        except Exception:
+            waiter_error = None
+        if waiter_error is None or waiter_error is error:
+            waiter_error = RuntimeError(f"Coalesced render failed: {str(error)}")
+        return waiter_error.with_traceback(None)
+    
+    def stats(self):
+        """Return render and coalescing counters"""
+        with self._lock:
+            return {
+                'renders': self.renders,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._in_flight)
+            }
+
 class QRCodeGenerator:
     def __init__(self):
+        self.coalescer = RenderCoalescer()
         self.default_options = {
             'size': 10,
             'border': 4,
@@ -27,7 +123,9 @@ class QRCodeGenerator:
             'background_color': '#FFFFFF',
             'module_drawer': 'square',
             'logo_path': None,
-            'logo_size_ratio': 0.3
+            'logo_size_ratio': 0.3,
+            'dpi': None,
+            'physical_size_mm': None
         }
     
     def _get_error_correction_level(self, level):
@@ -52,20 +150,92 @@ class QRCodeGenerator:
         }
         return drawers.get(drawer_type.lower(), SquareModuleDrawer())
     
-    def _create_qr_code(self, data, options):
-        """Create base QR code with given data and options"""
-        merged_options = {**self.default_options, **options}
+    def _positive_number(self, options, name):
+        """Read an optional numeric option, rejecting anything but a positive finite number"""
+        value = options.get(name)
+        if value is None:
+            return None
+        
+        # float(True) is 1.0, so booleans have to be rejected explicitly
+        if isinstance(value, bool):
+            raise ValueError(f"{name} must be a positive number")
         
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a positive number")
+        
+        if not math.isfinite(number) or number <= 0:
+            raise ValueError(f"{name} must be a positive number")
+        return number
+    
+    def _int_option(self, options, name, minimum):
+        """Read an integer option, rejecting non-integers and values below minimum"""
+        value = options[name]
+        if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+            qualifier = 'positive' if minimum > 0 else 'non-negative'
+            raise ValueError(f"{name} must be a {qualifier} integer")
+        return value
+    
+    def _resolve_box_size(self, qr, options):
+        """Compute module pixel size from dpi and physical_size_mm, falling back to size"""
+        dpi = self._positive_number(options, 'dpi')
+        physical_size_mm = self._positive_number(options, 'physical_size_mm')
+        
+        if dpi is not None and dpi > MAX_DPI:
+            raise ValueError(f"dpi must not exceed {MAX_DPI}")
+        
+        if physical_size_mm is None:
+            return options['size']
+        
+        if dpi is None:
+            raise ValueError("dpi is required when physical_size_mm is set")
+        
+        # Modules must be a whole number of pixels, so round to the closest fit
+        module_count = qr.modules_count + 2 * qr.border
+        target_pixels = physical_size_mm / MM_PER_INCH * dpi
+        return max(1, int(round(target_pixels / module_count)))
+    
+    def _make_qr(self, data, merged_options):
+        """Build and fit a QRCode instance with its final box size"""
         qr = qrcode.QRCode(
             version=1,
             error_correction=self._get_error_correction_level(merged_options['error_correction']),
-            box_size=merged_options['size'],
-            border=merged_options['border'],
+            box_size=self._int_option(merged_options, 'size', 1),
+            border=self._int_option(merged_options, 'border', 0),
         )
         
         qr.add_data(data)
         qr.make(fit=True)
         
+        qr.box_size = self._resolve_box_size(qr, merged_options)
+        
+        # Render cost grows with the square of the edge, whichever path draws it
+        pixel_size = (qr.modules_count + 2 * qr.border) * qr.box_size
+        if pixel_size > MAX_RENDER_PIXELS:
+            raise ValueError(f"Requested size exceeds {MAX_RENDER_PIXELS} pixels per side")
+        
+        return qr
+    
+    def _print_info(self, qr, merged_options):
+        """Describe the pixel and physical dimensions of a render"""
+        pixel_size = (qr.modules_count + 2 * qr.border) * qr.box_size
+        dpi = float(merged_options['dpi'])
+        
+        return {
+            'dpi': dpi,
+            'module_pixels': qr.box_size,
+            'pixel_size': pixel_size,
+            'physical_size_mm': round(pixel_size / dpi * MM_PER_INCH, 3)
+        }
+    
+    def _create_qr_code(self, data, options, qr=None):
+        """Create base QR code with given data and options"""
+        merged_options = {**self.default_options, **options}
+        
+        if qr is None:
+            qr = self._make_qr(data, merged_options)
+        
         # Try advanced styling first, fallback to basic if colors don't work
         if ADVANCED_STYLING and merged_options['module_drawer'] != 'square':
             try:
@@ -133,49 +303,298 @@ class QRCodeGenerator:
             logging.warning(f"Failed to add logo: {str(e)}")
             return qr_img
     
-    def _image_to_base64(self, img, format='PNG'):
+    def _image_to_base64(self, img, format='PNG', dpi=None):
         """Convert PIL image to base64 string"""
         buffer = io.BytesIO()
-        img.save(buffer, format=format)
+        if dpi is not None:
+            img.save(buffer, format=format, dpi=(float(dpi), float(dpi)))
+        else:
+            img.save(buffer, format=format)
         buffer.seek(0)
         
         img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
         return f"data:image/{format.lower()};base64,{img_base64}"
     
+    def _module_shape(self, merged_options):
+        """Module shape for the band and vector renderers, mirroring the PIL drawers"""
+        drawer = str(merged_options['module_drawer']).lower()
+        if not ADVANCED_STYLING or drawer not in ('rounded', 'circle'):
+            return 'square'
+        return drawer
+    
+    def _png_chunk(self, chunk_type, payload):
+        """Serialize a single PNG chunk"""
+        crc = zlib.crc32(chunk_type + payload) & 0xffffffff
+        return struct.pack('>I', len(payload)) + chunk_type + payload + struct.pack('>I', crc)
+    
+    def _parse_palette(self, merged_options):
+        """Resolve the background and foreground colours into a two-entry PNG palette"""
+        try:
+            background = ImageColor.getrgb(merged_options['background_color'])[:3]
+            foreground = ImageColor.getrgb(merged_options['foreground_color'])[:3]
+        except (ValueError, TypeError, AttributeError) as e:
+            raise ValueError(f"Invalid color: {str(e)}")
+        return bytes(background) + bytes(foreground)
+    
+    def _open_logo(self, merged_options):
+        """Open the logo for band rendering, or None when unset or unreadable"""
+        if not merged_options.get('logo_path'):
+            return None
+        try:
+            logo = Image.open(merged_options['logo_path'])
+            logo.load()
+            return logo.convert('RGB')
+        except Exception as e:
+            logging.warning(f"Failed to add logo: {str(e)}")
+            return None
+    
+    def _strip_options(self, merged_options):
+        """Validate and resolve everything _iter_png_strips needs before it starts"""
+        return {
+            'palette': self._parse_palette(merged_options),
+            'dpi': self._positive_number(merged_options, 'dpi'),
+            'shape': self._module_shape(merged_options),
+            'logo': self._open_logo(merged_options),
+            'logo_ratio': float(merged_options['logo_size_ratio'])
+        }
+    
+    def _circle_rows(self, box_size):
+        """Bit rows of a disc filling one module"""
+        radius = box_size / 2
+        rows = []
+        for y in range(box_size):
+            dy = (y + 0.5 - radius) / radius
+            half = radius * math.sqrt(max(0.0, 1 - dy * dy))
+            start = max(0, math.ceil(radius - half - 0.5))
+            end = min(box_size, math.floor(radius + half - 0.5) + 1)
+            rows.append('0' * start + '1' * max(0, end - start) + '0' * (box_size - max(start, end)))
+        return rows
+    
+    def _corner_rows(self, width, height, corner):
+        """Bit rows of a rounded corner quadrant ('nw', 'ne', 'se' or 'sw')
+        
+        The quadrant is a quarter ellipse centred on the module centre, as
+        drawn by qrcode's RoundedModuleDrawer.
+        """
+        rows = []
+        for y in range(height):
+            # Distance from the module centre, which is the quadrant's inner edge
+            dy = (height - y - 0.5 if corner[0] == 'n' else y + 0.5) / height
+            filled = min(width, math.floor(width * math.sqrt(max(0.0, 1 - dy * dy)) + 0.5))
+            if corner[1] == 'w':
+                rows.append('0' * (width - filled) + '1' * filled)
+            else:
+                rows.append('1' * filled + '0' * (width - filled))
+        return rows
+    
+    def _is_eye(self, qr, row, col):
+        """Whether a bordered matrix position is in a finder pattern, like qrcode's is_eye"""
+        row -= qr.border
+        col -= qr.border
+        width = qr.modules_count
+        if not (0 <= row < width and 0 <= col < width):
+            return False
+        return (row < 7 and col < 7) or (row < 7 and width - col < 8) or (width - row < 8 and col < 7)
+    
+    def _module_band_rows(self, qr, matrix, row_index, box_size, shape, tiles):
+        """Yield the bit string of each pixel row in one band of modules
+        
+        Finder patterns stay square for every shape, as StyledPilImage draws
+        them with its default eye drawer.
+        """
+        row = matrix[row_index]
+        empty = '0' * box_size
+        full = '1' * box_size
+        
+        if shape == 'square':
+            bits = ''.join(full if module else empty for module in row)
+            for _ in range(box_size):
+                yield bits
+            return
+        
+        if shape == 'circle':
+            modules = [
+                None if not module else 'eye' if self._is_eye(qr, row_index, col) else 'circle'
+                for col, module in enumerate(row)
+            ]
+            for y in range(box_size):
+                yield ''.join(empty if kind is None else full if kind == 'eye' else tiles['circle'][y]
+                              for kind in modules)
+            return
+        
+        # Rounded: a corner is rounded when both neighbours touching it are light
+        last = len(matrix) - 1
+        north = matrix[row_index - 1] if row_index > 0 else [False] * len(row)
+        south = matrix[row_index + 1] if row_index < last else [False] * len(row)
+        top = box_size // 2
+        left = box_size // 2
+        modules = []
+        for col, module in enumerate(row):
+            if not module:
+                modules.append(None)
+                continue
+            if self._is_eye(qr, row_index, col):
+                modules.append((False, False, False, False))
+                continue
+            west = col > 0 and row[col - 1]
+            east = col < last and row[col + 1]
+            modules.append((
+                not (north[col] or west), not (north[col] or east),
+                not (south[col] or west), not (south[col] or east)
+            ))
+        
+        for y in range(box_size):
+            upper = y < top
+            quadrant_y = y if upper else y - top
+            parts = []
+            for corners in modules:
+                if corners is None:
+                    parts.append(empty)
+                    continue
+                west_round, east_round = corners[:2] if upper else corners[2:]
+                vertical = 'n' if upper else 's'
+                parts.append(tiles[vertical + 'w'][quadrant_y] if west_round else full[:left])
+                parts.append(tiles[vertical + 'e'][quadrant_y] if east_round else full[left:])
+            yield ''.join(parts)
+    
+    def _shape_tiles(self, box_size, shape):
+        """Precompute the per-module bit rows a shape needs"""
+        if shape == 'circle':
+            return {'circle': self._circle_rows(box_size)}
+        if shape == 'rounded':
+            top = left = box_size // 2
+            sizes = {'n': top, 's': box_size - top, 'w': left, 'e': box_size - left}
+            return {
+                corner: self._corner_rows(sizes[corner[1]], sizes[corner[0]], corner)
+                for corner in ('nw', 'ne', 'sw', 'se')
+            }
+        return {}
+    
+    def _iter_logo_rows(self, logo, logo_size, band_rows, palette_image):
+        """Yield palette-index rows of the resized logo, resampling a band at a time"""
+        source_width, source_height = logo.size
+        for band_start in range(0, logo_size, band_rows):
+            band_end = min(logo_size, band_start + band_rows)
+            box = (0, band_start * source_height / logo_size, source_width, band_end * source_height / logo_size)
+            band = logo.resize((logo_size, band_end - band_start), Image.Resampling.LANCZOS, box=box)
+            indices = band.quantize(palette=palette_image, dither=Image.Dither.NONE).tobytes()
+            for offset in range(0, len(indices), logo_size):
+                yield indices[offset:offset + logo_size]
+    
+    def _iter_png_strips(self, qr, palette, dpi=None, shape='square', logo=None, logo_ratio=0.3):
+        """Encode a QR code as PNG one band of modules at a time
+        
+        Only one scanline, a small logo band and the compressor state are held
+        in memory, so the footprint does not grow with the output resolution.
+        Options must come from _strip_options, as the signature is sent before
+        anything else runs.
+        """
+        matrix = qr.get_matrix()
+        box_size = qr.box_size
+        pixel_size = len(matrix) * box_size
+        tiles = self._shape_tiles(box_size, shape)
+        
+        if logo is not None:
+            # 8-bit palette: background, foreground, white logo padding, then logo colours
+            logo_palette = logo.quantize(253, dither=Image.Dither.NONE).getpalette()[:253 * 3]
+            palette = palette + bytes((255, 255, 255)) + bytes(logo_palette)
+            palette += bytes(768 - len(palette))
+            palette_image = Image.new('P', (1, 1))
+            palette_image.putpalette(palette)
+            bit_depth = 8
+            
+            # Same geometry as _add_logo
+            logo_size = int(pixel_size * logo_ratio)
+            pad_start = (pixel_size - logo_size - 20) // 2
+            pad_end = pad_start + logo_size + 20
+            logo_start = pad_start + 10
+            logo_rows = self._iter_logo_rows(logo, logo_size, 64, palette_image)
+            bit_to_index = bytes.maketrans(b'01', b'\x00\x01')
+        else:
+            bit_depth = 1
+        
+        yield PNG_SIGNATURE
+        # Colour type 3 (palette): index 0 is background, 1 is foreground
+        yield self._png_chunk(b'IHDR', struct.pack('>IIBBBBB', pixel_size, pixel_size, bit_depth, 3, 0, 0, 0))
+        yield self._png_chunk(b'PLTE', palette)
+        
+        if dpi is not None:
+            pixels_per_metre = int(round(dpi / MM_PER_INCH * 1000))
+            yield self._png_chunk(b'pHYs', struct.pack('>IIB', pixels_per_metre, pixels_per_metre, 1))
+        
+        compressor = zlib.compressobj(9)
+        pending = []
+        pending_size = 0
+        pixel_y = 0
+        
+        for row_index in range(len(matrix)):
+            previous_bits = scanline = None
+            for bits in self._module_band_rows(qr, matrix, row_index, box_size, shape, tiles):
+                if logo is not None:
+                    row = bytearray(bits.encode('ascii').translate(bit_to_index))
+                    if pad_start <= pixel_y < pad_end:
+                        row[pad_start:pad_end] = b'\x02' * (pad_end - pad_start)
+                        if logo_start <= pixel_y < logo_start + logo_size:
+                            row[logo_start:logo_start + logo_size] = next(logo_rows)
+                    # Leading zero byte selects the "None" filter for the scanline
+                    scanline = b'\x00' + bytes(row)
+                elif bits is not previous_bits:
+                    padded = bits + '0' * (-len(bits) % 8)
+                    scanline = b'\x00' + int(padded, 2).to_bytes(len(padded) // 8, 'big')
+                    previous_bits = bits
+                
+                compressed = compressor.compress(scanline)
+                if compressed:
+                    pending.append(compressed)
+                    pending_size += len(compressed)
+                pixel_y += 1
+            
+            if pending_size >= STRIP_CHUNK_BYTES:
+                yield self._png_chunk(b'IDAT', b''.join(pending))
+                pending = []
+                pending_size = 0
+        
+        pending.append(compressor.flush())
+        yield self._png_chunk(b'IDAT', b''.join(pending))
+        yield self._png_chunk(b'IEND', b'')
+    
+    def _strips_to_base64(self, qr, merged_options):
+        """Convert a strip-encoded PNG to base64 string"""
+        png_bytes = b''.join(self._iter_png_strips(qr, **self._strip_options(merged_options)))
+        img_base64 = base64.b64encode(png_bytes).decode('utf-8')
+        return f"data:image/png;base64,{img_base64}"
+    
     def _generate_svg(self, data, options):
-        """Generate SVG format QR code"""
+        """Generate SVG format QR code, returning it with the fitted QRCode"""
         merged_options = {**self.default_options, **options}
         
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=self._get_error_correction_level(merged_options['error_correction']),
-            box_size=merged_options['size'],
-            border=merged_options['border'],
-        )
-        
-        qr.add_data(data)
-        qr.make(fit=True)
+        qr = self._make_qr(data, merged_options)
         
-        # Get the QR code matrix
+        # Get the QR code matrix (already includes the border)
         matrix = qr.get_matrix()
-        size = merged_options['size']
-        border = merged_options['border']
+        size = qr.box_size
         
         # Calculate SVG dimensions
         matrix_size = len(matrix)
-        total_size = (matrix_size + 2 * border) * size
+        total_size = matrix_size * size
+        
+        # Print renders carry their physical size so they scale correctly
+        if merged_options.get('physical_size_mm'):
+            physical_size = f"{self._print_info(qr, merged_options)['physical_size_mm']}mm"
+        else:
+            physical_size = total_size
         
         # Create SVG content
         svg_content = f'''<?xml version="1.0" encoding="UTF-8"?>
-<svg xmlns="http://www.w3.org/2000/svg" width="{total_size}" height="{total_size}" viewBox="0 0 {total_size} {total_size}">
+<svg xmlns="http://www.w3.org/2000/svg" width="{physical_size}" height="{physical_size}" viewBox="0 0 {total_size} {total_size}">
 <rect width="{total_size}" height="{total_size}" fill="{merged_options['background_color']}"/>'''
 
         # Add QR code modules
         for row in range(matrix_size):
             for col in range(matrix_size):
                 if matrix[row][col]:
-                    x = (col + border) * size
-                    y = (row + border) * size
+                    x = col * size
+                    y = row * size
                     
                     if merged_options['module_drawer'] == 'circle':
                         radius = size // 2
@@ -190,41 +609,130 @@ class QRCodeGenerator:
         
         svg_content += '\n</svg>'
         
-        return f"data:image/svg+xml;base64,{base64.b64encode(svg_content.encode()).decode()}"
+        return f"data:image/svg+xml;base64,{base64.b64encode(svg_content.encode()).decode()}", qr
+    
+    def _draw_pdf_modules(self, c, qr, x, y, width, palette, shape='square'):
+        """Draw the QR code as vector shapes, merging runs of square modules
+        
+        Finder patterns stay square, as in the PIL styled renders.
+        """
+        matrix = qr.get_matrix()
+        module = width / len(matrix)
+        half = module / 2
+        last = len(matrix) - 1
+        
+        c.setFillColorRGB(*(channel / 255 for channel in palette[:3]))
+        c.rect(x, y, width, width, stroke=0, fill=1)
+        c.setFillColorRGB(*(channel / 255 for channel in palette[3:]))
+        
+        for row_index, row in enumerate(matrix):
+            # PDF y axis points up, so the first matrix row is drawn at the top
+            row_y = y + width - (row_index + 1) * module
+            col = 0
+            while col < len(row):
+                if not row[col]:
+                    col += 1
+                    continue
+                
+                if shape == 'square' or self._is_eye(qr, row_index, col):
+                    run_start = col
+                    while col < len(row) and row[col] and (shape == 'square' or self._is_eye(qr, row_index, col)):
+                        col += 1
+                    c.rect(x + run_start * module, row_y, (col - run_start) * module, module, stroke=0, fill=1)
+                    continue
+                
+                module_x = x + col * module
+                if shape == 'circle':
+                    c.circle(module_x + half, row_y + half, half, stroke=0, fill=1)
+                else:
+                    # Rounded: a corner is rounded when both neighbours touching it are light
+                    north = row_index > 0 and matrix[row_index - 1][col]
+                    south = row_index < last and matrix[row_index + 1][col]
+                    west = col > 0 and row[col - 1]
+                    east = col < last and row[col + 1]
+                    centre_x = module_x + half
+                    centre_y = row_y + half
+                    quadrants = (
+                        (not (north or west), module_x, centre_y, 90),
+                        (not (north or east), centre_x, centre_y, 0),
+                        (not (south or west), module_x, row_y, 180),
+                        (not (south or east), centre_x, row_y, 270),
+                    )
+                    for rounded, quadrant_x, quadrant_y, start_angle in quadrants:
+                        if rounded:
+                            c.wedge(centre_x - half, centre_y - half, centre_x + half, centre_y + half,
+                                    start_angle, 90, stroke=0, fill=1)
+                        else:
+                            c.rect(quadrant_x, quadrant_y, half, half, stroke=0, fill=1)
+                col += 1
+    
+    def _draw_pdf_logo(self, c, x, y, width, pixel_size, merged_options):
+        """Draw the logo over the centre of the code, matching _add_logo's layout"""
+        try:
+            # _add_logo works in pixels, so scale its geometry into points
+            scale = width / pixel_size
+            logo_size = int(pixel_size * float(merged_options['logo_size_ratio']))
+            pad_start = (pixel_size - logo_size - 20) // 2
+            pad_size = (logo_size + 20) * scale
+            
+            c.setFillColorRGB(1, 1, 1)
+            c.rect(x + pad_start * scale, y + width - pad_start * scale - pad_size, pad_size, pad_size, stroke=0, fill=1)
+            c.drawImage(merged_options['logo_path'], x + (pad_start + 10) * scale,
+                        y + width - (pad_start + 10 + logo_size) * scale,
+                        width=logo_size * scale, height=logo_size * scale)
+        except Exception as e:
+            logging.warning(f"Failed to add logo: {str(e)}")
     
     def _generate_pdf(self, data, options):
-        """Generate PDF format QR code"""
+        """Generate PDF format QR code, returning it with the fitted QRCode"""
         merged_options = {**self.default_options, **options}
         
-        # Create QR code image first
-        img = self._create_qr_code(data, merged_options)
+        qr = self._make_qr(data, merged_options)
+        palette = self._parse_palette(merged_options)
+        
+        # Print renders are drawn at their physical size (PDF units are points)
+        if merged_options.get('physical_size_mm'):
+            img_width = img_height = self._print_info(qr, merged_options)['physical_size_mm'] / MM_PER_INCH * 72
+        else:
+            img_width = img_height = 200  # Fixed size for PDF
         
-        # Create temporary file for the image
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_img:
-            img.save(temp_img.name, 'PNG')
-            temp_img_path = temp_img.name
+        # Grow the page when the code does not fit on letter paper
+        pagesize = letter
+        if img_width > min(letter):
+            pagesize = (img_width, img_height)
         
         # Create PDF
         pdf_buffer = io.BytesIO()
-        c = canvas.Canvas(pdf_buffer, pagesize=letter)
+        c = canvas.Canvas(pdf_buffer, pagesize=pagesize)
         
         # Calculate position to center QR code
-        page_width, page_height = letter
-        img_width = img_height = 200  # Fixed size for PDF
+        page_width, page_height = pagesize
         x = (page_width - img_width) / 2
         y = (page_height - img_height) / 2
         
-        # Draw QR code on PDF
-        c.drawImage(temp_img_path, x, y, width=img_width, height=img_height)
-        c.save()
+        # Everything is drawn as vectors, so no raster is built at any resolution
+        self._draw_pdf_modules(c, qr, x, y, img_width, palette, self._module_shape(merged_options))
+        if merged_options.get('logo_path'):
+            pixel_size = (qr.modules_count + 2 * qr.border) * qr.box_size
+            self._draw_pdf_logo(c, x, y, img_width, pixel_size, merged_options)
         
-        # Clean up temporary file
-        os.unlink(temp_img_path)
+        c.save()
         
         pdf_base64 = base64.b64encode(pdf_buffer.getvalue()).decode('utf-8')
-        return f"data:application/pdf;base64,{pdf_base64}"
+        return f"data:application/pdf;base64,{pdf_base64}", qr
+    
+    def _render_key(self, data, merged_options):
+        """Build the canonical (payload, options, format) key for a render"""
+        key_options = {**merged_options, 'format': str(merged_options['format']).upper()}
+        return json.dumps([data, key_options], sort_keys=True, default=str)
     
     def _generate_response(self, data, options):
+        """Generate response, sharing the render with identical in-flight requests"""
+        merged_options = {**self.default_options, **options}
+        key = self._render_key(data, merged_options)
+        return self.coalescer.run(key, lambda: self._render_response(data, options))
+    
+    def _render_response(self, data, options):
         """Generate response with multiple formats"""
         merged_options = {**self.default_options, **options}
         format_type = merged_options['format'].upper()
@@ -238,18 +746,54 @@ class QRCodeGenerator:
         }
         
         if format_type == 'SVG':
-            response['data']['qr_code'] = self._generate_svg(data, options)
+            response['data']['qr_code'], qr = self._generate_svg(data, options)
             response['data']['format'] = 'SVG'
         elif format_type == 'PDF':
-            response['data']['qr_code'] = self._generate_pdf(data, options)
+            response['data']['qr_code'], qr = self._generate_pdf(data, options)
             response['data']['format'] = 'PDF'
         else:  # Default to PNG
-            img = self._create_qr_code(data, options)
-            response['data']['qr_code'] = self._image_to_base64(img, 'PNG')
+            qr = self._make_qr(data, merged_options)
+            pixel_size = (qr.modules_count + 2 * qr.border) * qr.box_size
+            
+            # Large rasters skip the full RGB PIL image entirely
+            if pixel_size * pixel_size > STRIP_RENDER_THRESHOLD:
+                response['data']['qr_code'] = self._strips_to_base64(qr, merged_options)
+            else:
+                img = self._create_qr_code(data, options, qr)
+                response['data']['qr_code'] = self._image_to_base64(img, 'PNG', merged_options['dpi'])
             response['data']['format'] = 'PNG'
         
+        if merged_options['dpi'] is not None:
+            response['data']['print'] = self._print_info(qr, merged_options)
+        
         return response
     
+    def stream_print_png(self, data, options=None):
+        """Render a print-resolution PNG as an iterator of encoded chunks
+        
+        Options are validated eagerly so errors surface before any bytes are
+        sent; the returned iterator then encodes the image strip by strip.
+        """
+        if options is None:
+            options = {}
+        
+        merged_options = {**self.default_options, **options}
+        if merged_options['dpi'] is None or merged_options['physical_size_mm'] is None:
+            raise ValueError("dpi and physical_size_mm are required for print renders")
+        
+        qr = self._make_qr(data, merged_options)
+        pixel_size = (qr.modules_count + 2 * qr.border) * qr.box_size
+        
+        if pixel_size * pixel_size > STRIP_RENDER_THRESHOLD:
+            strip_options = self._strip_options(merged_options)
+            return self._iter_png_strips(qr, **strip_options), self._print_info(qr, merged_options)
+        
+        # Small enough for PIL, which keeps the anti-aliased styled drawers
+        img = self._create_qr_code(data, options, qr)
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG', dpi=(float(merged_options['dpi']), float(merged_options['dpi'])))
+        return iter([buffer.getvalue()]), self._print_info(qr, merged_options)
+    
     def generate_url_qr(self, url, options=None):
         """Generate QR code for URL"""
         if options is None: